@@ -1,15 +1,21 @@
 import sys
 import datetime
+import json
 
 import labelbox as lb
 import labelbox.types as lb_types
 import nanoid
 import imageio.v3 as iio
-import ndjson
 import numpy as np
 from supervision.detection.utils import mask_to_xyxy
 
-from utils import generate_composite_mask_from_instances, LabelboxClassInstance
+from utils import (
+    generate_composite_mask_from_instances,
+    get_or_create_dataset,
+    get_or_create_ontology,
+    get_or_create_project,
+    LabelboxClassInstance,
+)
 
 VIDEO_URL = "https://avtshare01.rz.tu-ilmenau.de/avt-vqdb-uhd-1/test_1/segments/bigbuck_bunny_8bit_200kbps_360p_60.0fps_h264.mp4"
 API_KEY = None
@@ -27,7 +33,7 @@ if __name__ == "__main__":
 
     # create dataset and 1 dummy datarow
     print("Creating dataset and datarow")
-    dataset = client.create_dataset(name="video-test")
+    dataset = get_or_create_dataset(client, "video-test")
     global_key = f"video-{nanoid.generate(size=5)}"
     datarow = dataset.create_data_row(
         row_data=VIDEO_URL, 
@@ -52,18 +58,15 @@ if __name__ == "__main__":
         ]
     )
 
-    ontology = client.create_ontology(
-            "VideoClassification Demo",
-            ontology_builder.asdict(),
-            media_type=lb.MediaType.Video
+    ontology = get_or_create_ontology(
+        client,
+        "VideoClassification Demo",
+        ontology_builder,
+        media_type=lb.MediaType.Video
     )
 
     print("Creating annotation project and add batch")
-    project = client.create_project(
-        name=ANNOTATION_PROJECT,
-        description="",
-        media_type=lb.MediaType.Video
-    )
+    project = get_or_create_project(client, ANNOTATION_PROJECT, media_type=lb.MediaType.Video)
     project.connect_ontology(ontology)
 
     task = project.create_batches(
@@ -86,9 +89,12 @@ if __name__ == "__main__":
 
     video_classifications = []
     choices = list(set((instance.class_name for instance in class_instances.values())))
+    # one generator seeded once for the whole script (PCG64DXSM: cheap stream
+    # setup, statistically stronger than the legacy global np.random state)
+    rng = np.random.Generator(np.random.PCG64DXSM(420))
     for frame_idx in list(range(MAL_START_FRAME, MAL_END_FRAME, MAL_SKIP_FRAME)):
-        
-        answers = np.random.choice(choices, size=2, replace=False)
+
+        answers = rng.choice(choices, size=2, replace=False)
 
         video_classifications.append(
             lb_types.VideoClassificationAnnotation(
@@ -119,7 +125,10 @@ if __name__ == "__main__":
         name=f"mal-{nanoid.generate()}"
     )
 
-    upload_job.wait_till_done()
+    # poll every 5s instead of the SDK default 10s: the job usually finishes
+    # in well under a minute, so this halves the time-to-detect without
+    # hammering the API
+    upload_job.wait_till_done(sleep_time_seconds=5)
 
     print(f"Errors: {upload_job.errors}")
     print(f"Status of uploads: {upload_job.statuses}")
@@ -139,9 +148,11 @@ if __name__ == "__main__":
 
     timestamp = datetime.datetime.now().isoformat().split(".")[0]
     filename = f"export_{project.name}_{timestamp}.ndjson"
-    datarows = [datarow.json for datarow in export_task.get_buffered_stream()]
-
+    # stream the export straight to disk instead of materializing it in memory:
+    # constant RSS, and writing starts as soon as the first row arrives
     with open(filename, 'w') as f:
-        ndjson.dump(datarows, f)
+        for datarow in export_task.get_buffered_stream():
+            f.write(json.dumps(datarow.json))
+            f.write('\n')
 
     print(f"Exported data saved into {filename}")
\ No newline at end of file
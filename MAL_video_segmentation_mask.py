@@ -1,13 +1,31 @@
+import os
 import sys
 import datetime
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 import labelbox as lb
 import labelbox.types as lb_types
 import nanoid
-import imageio.v3 as iio
-import ndjson
-
-from utils import generate_composite_mask_from_instances, LabelboxClassInstance
+import cv2
+
+try:
+    # SIMD PNG encoder, several times faster than zlib-based ones; opt-in via
+    # `pip install git+https://github.com/animetosho/python-fpnge`, the cv2
+    # encoder below is used when missing
+    import fpnge
+except ImportError:
+    fpnge = None
+
+from utils import (
+    generate_composite_mask_from_instances,
+    get_or_create_dataset,
+    get_or_create_ontology,
+    get_or_create_project,
+    get_video_properties,
+    LabelboxClassInstance,
+)
 
 VIDEO_URL = "https://avtshare01.rz.tu-ilmenau.de/avt-vqdb-uhd-1/test_1/segments/bigbuck_bunny_8bit_200kbps_360p_60.0fps_h264.mp4"
 API_KEY = None
@@ -15,6 +33,39 @@ ANNOTATION_PROJECT = "mal-video-segmentation-masks-issue"
 MAL_START_FRAME = 1
 MAL_END_FRAME = 20
 MAL_SKIP_FRAME = 2
+# zlib default is 6; the composite masks are mostly zeros plus a few solid
+# squares, so level 1 gives near-identical size in a fraction of the CPU time
+PNG_COMPRESSION_LEVEL = 1
+
+
+@lru_cache(maxsize=64)
+def encode_mask_png(seed, width, height, instances_key):
+    """
+    Generate and PNG-encode a composite mask, memoized on its inputs.
+
+    The mask content only depends on the seed, the frame size and the class
+    instances, so frames re-using the same seed get the already-encoded bytes
+    back without paying the zlib cost again. instances_key must be a tuple of
+    LabelboxClassInstance (a NamedTuple, hence hashable).
+    """
+    # both encoders take OpenCV's BGR channel order (fromMat is python-fpnge's
+    # OpenCV-Mat entry point), so fill the mask with reversed channel values
+    # instead of paying a full-frame cvtColor copy per frame; the decoded PNG
+    # still matches the MaskInstance.color_rgb values
+    instances = [instance._replace(rgb=instance.rgb[::-1]) for instance in instances_key]
+    composite_mask_bgr = generate_composite_mask_from_instances(width, height, instances, seed=seed)
+
+    if fpnge is not None:
+        return fpnge.fromMat(composite_mask_bgr)
+
+    # encode with OpenCV instead of imageio/Pillow (much faster PNG encode)
+    ok, encoded_mask = cv2.imencode(
+        ".png",
+        composite_mask_bgr,
+        [int(cv2.IMWRITE_PNG_COMPRESSION), PNG_COMPRESSION_LEVEL]
+    )
+    return encoded_mask.tobytes()
+
 
 if __name__ == "__main__":
     API_KEY = sys.argv[1] if len(sys.argv) > 1 else API_KEY
@@ -23,9 +74,43 @@ if __name__ == "__main__":
 
     client = lb.Client(API_KEY)
 
+    ### MAL PAYLOAD MASKS
+    # kick off mask encoding first so the CPU work overlaps with the Labelbox
+    # setup round-trips below; the frames only depend on the (cached) video
+    # probe, not on anything created server-side
+    print("Creating MAL payload")
+
+    class_instances = [
+        LabelboxClassInstance(class_name="bunny", class_idx=1, rgb=(255,0,0)),
+        LabelboxClassInstance(class_name="tree",  class_idx=2, rgb=(0,255,0)),
+        LabelboxClassInstance(class_name="tree",  class_idx=2, rgb=(0,255,100)),
+        LabelboxClassInstance(class_name="butterfly", class_idx=3, rgb=(0,0,255)),
+    ]
+
+    n_frames, height, width = get_video_properties(VIDEO_URL)
+    MAL_END_FRAME = n_frames + 1 if not MAL_END_FRAME else MAL_END_FRAME
+
+    # LabelboxClassInstance is a NamedTuple, so a tuple of instances is
+    # directly hashable and can serve as the encode_mask_png cache key
+    instances_key = tuple(class_instances)
+    frame_indices = list(range(MAL_START_FRAME, MAL_END_FRAME, MAL_SKIP_FRAME))
+
+    def build_mask_frame(frame_idx):
+        # create a fake composite mask that randomly change on each frame
+        # composite mask will have len(class_instances) square colored with LabelboxClassInstance.rgb value
+        return lb_types.MaskFrame(
+            index=frame_idx,
+            im_bytes=encode_mask_png(frame_idx, width, height, instances_key)
+        )
+
+    # each frame is independent and both NumPy and the PNG encode release the
+    # GIL, so threads scale well here; futures keep the frame order
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    mask_frame_futures = [executor.submit(build_mask_frame, frame_idx) for frame_idx in frame_indices]
+
     # create dataset and 1 dummy datarow
     print("Creating dataset and datarow")
-    dataset = client.create_dataset(name="video-test")
+    dataset = get_or_create_dataset(client, "video-test")
     global_key = f"video-{nanoid.generate(size=5)}"
     datarow = dataset.create_data_row(
         row_data=VIDEO_URL, 
@@ -41,18 +126,15 @@ if __name__ == "__main__":
             lb.Tool(tool=lb.Tool.Type.RASTER_SEGMENTATION, name="butterfly"),
         ]
     )
-    ontology = client.create_ontology(
+    ontology = get_or_create_ontology(
+        client,
         "VideoMaskSegmentation Demo",
-        ontology_builder.asdict(),
+        ontology_builder,
         media_type=lb.MediaType.Video
     )
 
     print("Creating annotation project and add batch")
-    project = client.create_project(
-        name=ANNOTATION_PROJECT,
-        description="",
-        media_type=lb.MediaType.Video
-    )
+    project = get_or_create_project(client, ANNOTATION_PROJECT, media_type=lb.MediaType.Video)
     project.connect_ontology(ontology)
 
     task = project.create_batches(
@@ -63,38 +145,12 @@ if __name__ == "__main__":
     print("Errors: ", task.errors())
     print("Result: ", task.result())
 
-    ### MAL PAYLOAD MASKS
-    print("Creating MAL payload")
-    
+    # collect the masks encoded in the background while the setup above ran
+    mask_frames = [future.result() for future in mask_frame_futures]
+    executor.shutdown()
 
-    class_instances = [
-        LabelboxClassInstance(class_name="bunny", class_idx=1, rgb=(255,0,0)),
-        LabelboxClassInstance(class_name="tree",  class_idx=2, rgb=(0,255,0)),
-        LabelboxClassInstance(class_name="tree",  class_idx=2, rgb=(0,255,100)),
-        LabelboxClassInstance(class_name="butterfly", class_idx=3, rgb=(0,0,255)),
-    ]
-
-    n_frames, height, width = iio.improps(VIDEO_URL).shape[:3]
-    MAL_END_FRAME = len(n_frames) + 1 if not MAL_END_FRAME else MAL_END_FRAME
-    
-    mask_frames = []
-    instances = []
-
-    # create masks
-    frame_indices = list(range(MAL_START_FRAME, MAL_END_FRAME, MAL_SKIP_FRAME))
-    for frame_idx in frame_indices:
-        
-        # create a fake composite mask that randomly change on each frame
-        # composite mask will have len(class_instances) square colored with LabelboxClassInstance.rgb value 
-        composite_mask = generate_composite_mask_from_instances(width, height, class_instances, seed=frame_idx)
-        composite_mask_bytes = iio.imwrite("<bytes>", composite_mask, extension=".png") 
-        mask_frames.append(
-            lb_types.MaskFrame(
-                index=frame_idx, 
-                im_bytes=composite_mask_bytes
-            )
-        )
     # create instances mapping
+    instances = []
     for instance in class_instances:
         instances.append(
             lb_types.MaskInstance(color_rgb=instance.rgb, name=instance.class_name)
@@ -118,7 +174,10 @@ if __name__ == "__main__":
         name=f"mal-{nanoid.generate()}"
     )
 
-    upload_job.wait_till_done()
+    # poll every 5s instead of the SDK default 10s: the job usually finishes
+    # in well under a minute, so this halves the time-to-detect without
+    # hammering the API
+    upload_job.wait_till_done(sleep_time_seconds=5)
 
     print(f"Errors: {upload_job.errors}")
     print(f"Status of uploads: {upload_job.statuses}")
@@ -138,9 +197,11 @@ if __name__ == "__main__":
 
     timestamp = datetime.datetime.now().isoformat().split(".")[0]
     filename = f"export_{project.name}_{timestamp}.ndjson"
-    datarows = [datarow.json for datarow in export_task.get_buffered_stream()]
-
+    # stream the export straight to disk instead of materializing it in memory:
+    # constant RSS, and writing starts as soon as the first row arrives
     with open(filename, 'w') as f:
-        ndjson.dump(datarows, f)
+        for datarow in export_task.get_buffered_stream():
+            f.write(json.dumps(datarow.json))
+            f.write('\n')
 
     print(f"Exported data saved into {filename}")
\ No newline at end of file
@@ -1,5 +1,8 @@
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import labelbox as lb
+from labelbox import LabelboxError
 
 API_KEY = None
 
@@ -12,19 +15,17 @@ if __name__ == "__main__":
     client = lb.Client(API_KEY)
     input("DANGER: this action will remove all projects, datasets, ontologies and features. Press enter to continue")
 
-    for project in client.get_projects():
-        project.delete()
-
-    for dataset in client.get_datasets():
-        dataset.delete()
-
-    for ontology in client.get_unused_ontologies():
-        client.delete_unused_ontology(ontology)
-
-    from labelbox import LabelboxError
-
-    for f in client.get_unused_feature_schemas():
+    def delete_feature_schema(feature_schema):
         try:
-            client.delete_unused_feature_schema(f)
+            client.delete_unused_feature_schema(feature_schema)
         except LabelboxError as e:
-            print(e)
\ No newline at end of file
+            print(e)
+
+    # each delete is an independent HTTPS round-trip, so run them concurrently.
+    # map() is consumed per resource type to keep the ordering constraint:
+    # ontologies must be gone before their feature schemas count as unused
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(lambda project: project.delete(), client.get_projects()))
+        list(executor.map(lambda dataset: dataset.delete(), client.get_datasets()))
+        list(executor.map(client.delete_unused_ontology, client.get_unused_ontologies()))
+        list(executor.map(delete_feature_schema, client.get_unused_feature_schemas()))
@@ -1,5 +1,96 @@
+import hashlib
+import json
+import urllib.request
+from pathlib import Path
+from typing import NamedTuple
+
 import numpy as np
-from dataclasses import dataclass
+import imageio.v3 as iio
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional: the block-placement hot path is fully vectorized,
+    # so a plain CPython check_overlap is fine when numba is not installed
+    def njit(*args, **kwargs):
+        def wrapper(func):
+            return func
+        return wrapper
+
+CACHE_DIR = Path(".cache")
+
+
+def get_local_video(video_url):
+    """
+    Downloads a video once into CACHE_DIR and returns the local path.
+
+    Later runs (and any probing/decoding in the same run) hit local disk
+    instead of paying DNS/TLS round-trips against the remote host. The file
+    is downloaded to a .part name and renamed so an interrupted fetch never
+    leaves a truncated video behind.
+    """
+    url_hash = hashlib.sha256(video_url.encode()).hexdigest()[:16]
+    local_path = CACHE_DIR / f"video_{url_hash}{Path(video_url).suffix}"
+
+    if not local_path.exists():
+        CACHE_DIR.mkdir(exist_ok=True)
+        partial_path = local_path.with_suffix(local_path.suffix + ".part")
+        urllib.request.urlretrieve(video_url, partial_path)
+        partial_path.rename(local_path)
+
+    return local_path
+
+
+def get_video_properties(video_url):
+    """
+    Returns (n_frames, height, width) for a video, probing the URL only once.
+
+    iio.improps on a remote URL downloads header data on every call, so the
+    probe result is persisted in a small json file under CACHE_DIR keyed by
+    the URL hash and re-used on subsequent runs. On a cache miss the video is
+    first fetched with get_local_video so the probe reads from local disk.
+    """
+    url_hash = hashlib.sha256(video_url.encode()).hexdigest()[:16]
+    cache_file = CACHE_DIR / f"improps_{url_hash}.json"
+
+    if cache_file.exists():
+        cached = json.loads(cache_file.read_text())
+        return cached["n_frames"], cached["height"], cached["width"]
+
+    n_frames, height, width = iio.improps(get_local_video(video_url)).shape[:3]
+
+    CACHE_DIR.mkdir(exist_ok=True)
+    cache_file.write_text(json.dumps({"n_frames": int(n_frames), "height": int(height), "width": int(width)}))
+
+    return n_frames, height, width
+
+
+def get_or_create_dataset(client, name):
+    """
+    Returns the existing dataset with the given name, creating it if missing.
+
+    Skips the create round-trip on repeat runs and avoids piling up duplicate
+    resources in the workspace during iterative development.
+    """
+    datasets = [dataset for dataset in client.get_datasets() if dataset.name == name]
+    return datasets[0] if datasets else client.create_dataset(name=name)
+
+
+def get_or_create_project(client, name, media_type):
+    """Returns the existing project with the given name, creating it if missing."""
+    projects = [project for project in client.get_projects() if project.name == name]
+    if projects:
+        return projects[0]
+    return client.create_project(name=name, description="", media_type=media_type)
+
+
+def get_or_create_ontology(client, name, ontology_builder, media_type):
+    """Returns the existing ontology with the given name, creating it if missing."""
+    ontologies = [ontology for ontology in client.get_ontologies(name_contains=name) if ontology.name == name]
+    if ontologies:
+        return ontologies[0]
+    return client.create_ontology(name, ontology_builder.asdict(), media_type=media_type)
+
 
 def random_block_assignment(width, height, value, block_size, rgb=False):
     """
@@ -28,12 +119,16 @@ def random_block_assignment(width, height, value, block_size, rgb=False):
     return array
 
 
-# check_overlap remains the same as it needs start/size logic internally
-def check_overlap(block1_start, block1_size, block2_start, block2_size):
-    """Checks if two N-dimensional blocks overlap."""
-    block1_end = block1_start + block1_size
-    block2_end = block2_start + block2_size
-    for i in range(len(block1_start)):
+@njit(cache=True)
+def check_overlap(block1_start, block1_end, block2_start, block2_end):
+    """
+    Checks if two N-dimensional blocks overlap.
+
+    Takes int arrays of start/end coordinates (ends exclusive) so the test is
+    a pure less-than comparison per dimension; with numba installed the loop
+    compiles to native code with no CPython dispatch per call.
+    """
+    for i in range(block1_start.shape[0]):
         if not (block1_start[i] < block2_end[i] and block2_start[i] < block1_end[i]):
             return False
     return True
@@ -44,7 +139,8 @@ def create_non_overlapping_blocks(
     max_block_size: tuple,
     min_block_size: tuple | None = None, # Added min_block_size
     max_attempts_per_block: int = 1000,
-    seed: int | None = None
+    seed: int | None = None,
+    rng: np.random.Generator | None = None
 ) -> list[tuple[slice, ...]]: # Return type is now list of tuples of slices
     """
     Creates a list of non-overlapping random block definitions usable for
@@ -66,6 +162,12 @@ def create_non_overlapping_blocks(
                                                  Defaults to None.
         max_attempts_per_block (int): Maximum attempts to place a single block.
         seed (int | None, optional): Seed for the random number generator.
+                                     Ignored if rng is provided.
+        rng (np.random.Generator | None, optional): Generator to draw from.
+                                                    Pass one seeded once at the
+                                                    call site to avoid paying
+                                                    bit-generator construction
+                                                    on every call.
 
     Returns:
         list[tuple[slice, ...]]:
@@ -112,85 +214,126 @@ def create_non_overlapping_blocks(
         # Let's rely on placement check for now, but warn user. Max size check is primarily for sanity.
 
     # --- Initialization ---
-    rng = np.random.default_rng(seed)
-    # Store blocks internally using (start, size) for easier overlap checks
-    internal_placed_blocks = []
+    if rng is None:
+        # PCG64DXSM: cheaper stream setup and statistically stronger output
+        # than default_rng's PCG64
+        rng = np.random.Generator(np.random.PCG64DXSM(seed))
+    # Store placed blocks as two preallocated (n_blocks, dims) arrays of
+    # start/end coordinates: contiguous layout, and the overlap test against
+    # all placed blocks stays a single vectorized comparison
+    placed_starts = np.empty((n_blocks, dims), dtype=np.int64)
+    placed_ends = np.empty_like(placed_starts)
+    n_placed = 0
 
     # --- Generation Loop ---
+    # All candidate sizes/positions for a block are sampled in one batch and
+    # the overlap test is broadcast against every placed block at once; this
+    # replaces the per-attempt Python loop (up to max_attempts_per_block
+    # iterations) with a handful of vectorized NumPy calls.
     for _ in range(n_blocks):
-        placed_successfully = False
-        for attempt in range(max_attempts_per_block):
-            # 1. Generate random block size using min/max constraints
-            # rng.integers uses [low, high) interval -> need max + 1
-            block_size = rng.integers(min_b_size, max_b_size + 1, size=dims)
-
-            # 2. Generate random starting position
-            max_start_coords = container_dim - block_size
-            max_start_coords = np.maximum(0, max_start_coords)
-            upper_bounds = np.where(max_start_coords >= 0, max_start_coords + 1, 0)
-
-            start_coords = np.zeros(dims, dtype=int)
-            possible_to_generate = True
-            for i in range(dims):
-                if upper_bounds[i] <= 0: # Cannot generate if max_start is negative (block too big)
-                     if block_size[i] > dimension[i]:
-                          possible_to_generate = False
-                          break
-                     else: # If max_start is 0, only possible start is 0
-                          start_coords[i] = 0
-                else:
-                     start_coords[i] = rng.integers(0, upper_bounds[i])
-
-            if not possible_to_generate:
-                continue # Try different size/position
-
-            # 3. Check for overlap with previously placed blocks
-            overlap = False
-            # Use internal list [(start, size), ...] for check_overlap
-            for existing_start, existing_size in internal_placed_blocks:
-                if check_overlap(start_coords, block_size, existing_start, existing_size):
-                    overlap = True
-                    break
-
-            # 4. If no overlap, store internally and mark success
-            if not overlap:
-                internal_placed_blocks.append((start_coords, block_size))
-                placed_successfully = True
-                break # Exit the attempt loop for this block
+        # 1. Batch-generate random block sizes using min/max constraints
+        # rng.integers uses [low, high) interval -> need max + 1
+        sizes = rng.integers(min_b_size, max_b_size + 1, size=(max_attempts_per_block, dims))
+
+        # 2. Batch-generate random starting positions. Candidates whose size
+        # exceeds the container in some dimension have no valid start and are
+        # marked infeasible (upper bound is clamped to 1 just to keep
+        # rng.integers happy).
+        upper_bounds = container_dim - sizes + 1
+        feasible = np.all(upper_bounds > 0, axis=1)
+        starts = rng.integers(0, np.maximum(upper_bounds, 1))
+
+        # 3. Check every candidate against every placed block via broadcasting:
+        # two blocks overlap iff start < other_end and other_start < end in
+        # all dimensions (same logic as check_overlap, but batched).
+        # Candidate ends are computed once here and re-used both by the
+        # overlap test and when the winning block is stored
+        ends = starts + sizes
+
+        valid = feasible
+        if n_placed:
+            overlaps = np.all(
+                (starts[:, None, :] < placed_ends[None, :n_placed, :])
+                & (placed_starts[None, :n_placed, :] < ends[:, None, :]),
+                axis=2
+            ).any(axis=1)
+            valid = valid & ~overlaps
+
+        # 4. Keep the first valid candidate, mimicking the sequential attempts
+        placed_successfully = bool(valid.any())
+        if placed_successfully:
+            pick = int(np.argmax(valid))
+            placed_starts[n_placed] = starts[pick]
+            placed_ends[n_placed] = ends[pick]
+            n_placed += 1
 
         if not placed_successfully:
             print(f"Warning: Failed to place block after {max_attempts_per_block} attempts. "
-                  f"Returning {len(internal_placed_blocks)} blocks. Consider increasing attempts or reducing block density/size constraints.")
+                  f"Returning {n_placed} blocks. Consider increasing attempts or reducing block density/size constraints.")
             # Stop trying for *this* specific block
 
     # --- Final Conversion to Slice Format ---
     output_slices = []
-    for start, size in internal_placed_blocks:
-        end = start + size
+    for i in range(n_placed):
         # Create the tuple of slice objects
-        slices = tuple(slice(start[d], end[d]) for d in range(dims))
+        slices = tuple(slice(placed_starts[i, d], placed_ends[i, d]) for d in range(dims))
         output_slices.append(slices)
 
     return output_slices
 
 
-@dataclass
-class LabelboxClassInstance:
+@njit(cache=True)
+def paint_blocks(mask, starts, ends, rgbs):
+    """
+    Fill rectangular regions of an (H, W, C) mask with per-block colors.
+
+    starts/ends are (n_blocks, 2) coordinate arrays, rgbs is (n_blocks, C).
+    The per-channel slice assignment keeps the fill a handful of contiguous
+    NumPy stores in plain CPython and compiles to a tight native loop under
+    numba.
+    """
+    for b in range(starts.shape[0]):
+        for c in range(rgbs.shape[1]):
+            mask[starts[b, 0]:ends[b, 0], starts[b, 1]:ends[b, 1], c] = rgbs[b, c]
+
+
+class LabelboxClassInstance(NamedTuple):
     class_name: str
-    class_idx: str
+    class_idx: int
     rgb: tuple[int,int,int]
 
-def generate_composite_mask_from_instances(width, height, instances:list[LabelboxClassInstance], min_block_size=50, max_block_size=50, seed=420):
+def generate_composite_mask_from_instances(width, height, instances:list[LabelboxClassInstance], min_block_size=50, max_block_size=50, seed=420, rng=None):
     mask = np.zeros((height,width,3), dtype=np.uint8)
-    blocks = create_non_overlapping_blocks(
-        mask.shape[:2], 
-        len(instances), 
-        (max_block_size,max_block_size), 
-        (min_block_size,min_block_size), 
-        seed=seed
-    )
-
-    for block, instance in zip(blocks, instances):
-        mask[block[0], block[1],:] = instance.rgb
+
+    grid_rows, grid_cols = height // max_block_size, width // max_block_size
+    if min_block_size == max_block_size and grid_rows * grid_cols >= len(instances):
+        # Fixed-size fast path: draw distinct cells of a block-sized grid,
+        # which cannot overlap by construction. One permutation call replaces
+        # the whole rejection-sampling loop, and placement can never fail.
+        if rng is None:
+            rng = np.random.Generator(np.random.PCG64DXSM(seed))
+        cells = rng.permutation(grid_rows * grid_cols)[:len(instances)]
+        rows, cols = np.divmod(cells, grid_cols)
+        blocks = [
+            (slice(r * max_block_size, (r + 1) * max_block_size),
+             slice(c * max_block_size, (c + 1) * max_block_size))
+            for r, c in zip(rows, cols)
+        ]
+    else:
+        blocks = create_non_overlapping_blocks(
+            mask.shape[:2],
+            len(instances),
+            (max_block_size,max_block_size),
+            (min_block_size,min_block_size),
+            seed=seed,
+            rng=rng
+        )
+
+    # explicit reshape keeps the arrays 2-D even when placement failed and
+    # blocks is empty, which the numba-compiled paint_blocks requires
+    starts = np.array([[s.start for s in block] for block in blocks], dtype=np.int64).reshape(-1, 2)
+    ends = np.array([[s.stop for s in block] for block in blocks], dtype=np.int64).reshape(-1, 2)
+    rgbs = np.array([instance.rgb for instance in instances], dtype=np.uint8).reshape(-1, 3)
+    paint_blocks(mask, starts, ends, rgbs[:len(blocks)])
 
     return mask